@@ -1,123 +1,402 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import yfinance as yf
 import pandas as pd
 import talib
+from talib import stream as talib_stream
+
+# Directory for cached downloads; each ticker keeps one append-only parquet
+# history there, and only date ranges not yet on disk are downloaded.
+CACHE_DIR = "cache"
+
+# Candlestick patterns to detect, mapping TA-Lib function names to
+# human-readable labels. Shared by the full-history and latest-bar scans.
+CANDLESTICK_PATTERNS = {
+    "CDLDOJI": "Doji",
+    "CDLHAMMER": "Hammer",
+    "CDLINVERTEDHAMMER": "Inverted Hammer",
+    "CDLMORNINGSTAR": "Morning Star",
+    "CDLEVENINGSTAR": "Evening Star",
+    "CDLENGULFING": "Engulfing",
+    "CDLPIERCING": "Piercing Pattern",
+    "CDLDARKCLOUDCOVER": "Dark Cloud Cover",
+    "CDLHARAMI": "Harami",
+    "CDLHARAMICROSS": "Harami Cross",
+    "CDL3WHITESOLDIERS": "Three White Soldiers",
+    "CDL3BLACKCROWS": "Three Black Crows",
+    "CDLDRAGONFLYDOJI": "Dragonfly Doji",
+    "CDLGRAVESTONEDOJI": "Gravestone Doji",
+    "CDLMARUBOZU": "Marubozu",
+    "CDLSHOOTINGSTAR": "Shooting Star",
+    "CDLHANGINGMAN": "Hanging Man"
+}
+
+# The longest lookback any of the pattern functions needs; the latest-bar
+# scan only has to feed this many trailing bars to TA-Lib.
+_MAX_PATTERN_LOOKBACK = 50
+
+def _resolve_pattern_functions(module):
+    """
+    Looks up the pattern functions from CANDLESTICK_PATTERNS on a TA-Lib
+    module, warning once per missing name. Returns parallel lists of
+    functions and their human-readable labels.
+    """
+    functions = []
+    names = []
+    for pattern_func_name, pattern_name in CANDLESTICK_PATTERNS.items():
+        pattern_function = getattr(module, pattern_func_name, None)
+        if pattern_function:
+            functions.append(pattern_function)
+            names.append(pattern_name)
+        else:
+            print(f"Warning: TA-Lib function for {pattern_func_name} not found.")
+    return functions, names
+
+# Resolve the function tables once at import instead of repeating the
+# getattr lookups (and missing-function checks) on every scan call
+_PATTERN_FUNCTIONS, _PATTERN_NAMES = _resolve_pattern_functions(talib)
+_STREAM_PATTERN_FUNCTIONS, _STREAM_PATTERN_NAMES = _resolve_pattern_functions(talib_stream)
+_PATTERN_NAME_ARRAY = np.array(_PATTERN_NAMES, dtype=object)
+
+# In-process memo above the parquet cache, so repeat requests within one
+# session skip even the disk read. Keyed on (ticker, start, end).
+_memory_cache = {}
+
+def _download_range(company_ticker, start_date, end_date):
+    """
+    Downloads one date range for a ticker and flattens MultiIndex columns,
+    so the result can be stored in (and appended to) the parquet history.
+    """
+    data = yf.download(company_ticker, start=start_date, end=end_date, progress=False, auto_adjust=True)
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+def _download_with_cache(company_ticker, start_date, end_date):
+    """
+    Returns historical data for a ticker, downloading as little as possible.
+
+    Each ticker keeps a single append-only parquet history on disk. A
+    request first loads that history, downloads only the date ranges it
+    is missing (typically just the bars published since the last run),
+    appends them to the file, and slices the requested window out of the
+    combined history. Repeat requests within one session are additionally
+    served from an in-memory memo.
+    """
+    cache_key = (company_ticker, start_date, end_date)
+    if cache_key in _memory_cache:
+        # Return a copy so callers can clean the frame in place without
+        # corrupting the cached original
+        return _memory_cache[cache_key].copy()
+
+    safe_ticker = "".join([c for c in company_ticker if c.isalnum()]).strip()
+    cache_path = os.path.join(CACHE_DIR, f"{safe_ticker}.parquet")
+
+    history = None
+    if os.path.exists(cache_path):
+        try:
+            history = pd.read_parquet(cache_path)
+        except Exception as e:
+            print(f"Warning: could not read cache file {cache_path} ({e}). Re-downloading.")
+
+    history_grew = False
+    if history is None or history.empty:
+        history = _download_range(company_ticker, start_date, end_date)
+        history_grew = not history.empty
+    else:
+        new_parts = []
+
+        # Missing head: the request starts before the cached history does
+        cached_start = history.index.min()
+        if pd.Timestamp(start_date) < cached_start:
+            head = _download_range(company_ticker, start_date, cached_start.strftime('%Y-%m-%d'))
+            if not head.empty:
+                new_parts.append(head)
+
+        # Missing tail: bars published since the last cached one
+        next_day = history.index.max() + pd.Timedelta(days=1)
+        if pd.Timestamp(end_date) > next_day:
+            tail = _download_range(company_ticker, next_day.strftime('%Y-%m-%d'), end_date)
+            if not tail.empty:
+                new_parts.append(tail)
+
+        if new_parts:
+            history = pd.concat([history] + new_parts).sort_index()
+            history = history[~history.index.duplicated(keep='last')]
+            history_grew = True
+
+    if history_grew:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            history.to_parquet(cache_path)
+        except Exception as e:
+            # Caching is best-effort; the analysis still works without it
+            print(f"Warning: could not write cache file {cache_path} ({e}).")
+
+    # Slice the requested window (end exclusive, matching yf.download)
+    data = history[(history.index >= start_date) & (history.index < end_date)]
+
+    if not data.empty:
+        _memory_cache[cache_key] = data.copy()
+
+    return data
+
+def fetch_all(tickers, start_date, end_date):
+    """
+    Downloads historical data for several tickers in one batched request.
+
+    A single yf.download call with threads=True fetches all tickers
+    concurrently inside yfinance instead of serializing one network
+    round-trip per ticker. Returns a dict mapping each ticker to its own
+    OHLCV DataFrame (tickers with no data are omitted).
+
+    Args:
+        tickers (list): Ticker symbols to fetch.
+        start_date (str): Start date in YYYY-MM-DD format.
+        end_date (str): End date in YYYY-MM-DD format.
+    """
+    data = yf.download(
+        list(tickers), start=start_date, end=end_date,
+        group_by='ticker', threads=True, progress=False, auto_adjust=True
+    )
+
+    if data.empty:
+        return {}
+
+    per_ticker = {}
+    if isinstance(data.columns, pd.MultiIndex):
+        for ticker in tickers:
+            if ticker in data.columns.get_level_values(0):
+                frame = data.xs(ticker, axis=1, level=0).dropna(how='all')
+                if not frame.empty:
+                    per_ticker[ticker] = frame
+    else:
+        # A single ticker comes back with flat columns
+        per_ticker[tickers[0]] = data
+
+    return per_ticker
+
+def analyze_tickers(jobs, use_processes=False):
+    """
+    Runs get_candlestick_patterns for several tickers in parallel.
+
+    Each job usually blocks on network I/O, so the default thread pool
+    overlaps the downloads (and the TA-Lib calls, which release the GIL)
+    instead of running the tickers one after another. When the data is
+    already on disk and the run is compute-bound — e.g. rescanning a
+    large cached universe — use_processes=True switches to a process
+    pool so the Python-side work spreads across cores.
+
+    Args:
+        jobs (list): (ticker, start_date, end_date) tuples.
+        use_processes (bool): Use a process pool instead of threads.
+
+    Returns:
+        dict: Ticker mapped to its patterns DataFrame (or None).
+    """
+    if not jobs:
+        return {}
+
+    if use_processes:
+        executor_cls = ProcessPoolExecutor
+        max_workers = min(os.cpu_count() or 1, len(jobs))
+    else:
+        executor_cls = ThreadPoolExecutor
+        max_workers = min(32, len(jobs))
+
+    with executor_cls(max_workers=max_workers) as executor:
+        results = list(executor.map(get_candlestick_patterns, *zip(*jobs)))
+
+    return {job[0]: result for job, result in zip(jobs, results)}
+
+def _clean_ohlcv(data, company_ticker, start_date, end_date):
+    """
+    Standardizes and validates a raw download into a clean OHLCV frame.
 
-def get_candlestick_patterns(company_ticker, start_date, end_date):
+    Flattens MultiIndex columns, uppercases column names, coerces the
+    OHLCV columns to numeric and drops rows TA-Lib cannot handle.
+    Returns the cleaned DataFrame, or None (with a message) if the data
+    is missing or unusable.
+    """
+    if data.empty:
+        print(f"No data found for {company_ticker} between {start_date} and {end_date}.")
+        return None
+
+    # If columns are MultiIndex, flatten them to a single level
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+
+    # Standardize column names to uppercase (astype(str) also covers any
+    # non-string labels)
+    data.columns = data.columns.astype(str).str.upper()
+
+    # Ensure required columns are present and properly named for TA-Lib
+    required_columns = ['OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOLUME']
+
+    if not all(col in data.columns for col in required_columns):
+        print(f"Missing required OHLCV data after standardization for {company_ticker}. "
+              f"Available columns: {data.columns.tolist()}")
+        return None
+
+    # Ensure the values passed to TA-Lib are numeric. yfinance already
+    # returns numeric dtypes, so one block astype (a no-op copy=False cast
+    # in the common case) replaces five per-column pd.to_numeric passes;
+    # per-value coercion remains as the fallback for dirty data.
+    try:
+        data[required_columns] = data[required_columns].astype(np.float64, copy=False)
+    except (TypeError, ValueError):
+        data[required_columns] = data[required_columns].apply(pd.to_numeric, errors='coerce')
+
+    # Drop rows with any NaN values in the OHLCV columns, as TA-Lib functions require non-NaN inputs
+    data.dropna(subset=['OPEN', 'HIGH', 'LOW', 'CLOSE'], inplace=True)
+
+    if data.shape[0] < 2:
+        print(f"Not enough valid OHLC data after cleaning for {company_ticker}.")
+        return None
+
+    return data
+
+def get_latest_patterns(company_ticker, start_date, end_date, data=None):
+    """
+    Detects candlestick patterns on the most recent bar only.
+
+    Uses TA-Lib's stream interface, which evaluates just the newest bar
+    from a short trailing window instead of recomputing every pattern
+    over the full history. This is the cheap path for polling use, where
+    each refresh only appends one new bar.
+
+    Returns a DataFrame with one row per pattern firing on the latest
+    bar, or None if nothing fired or the data is unusable.
+    """
     try:
-        # Download historical data
-        # Use auto_adjust=True for adjusted prices, and progress=False for cleaner output
-        data = yf.download(company_ticker, start=start_date, end=end_date, progress=False, auto_adjust=True)
+        if data is None:
+            data = _download_with_cache(company_ticker, start_date, end_date)
 
-        if data.empty:
-            print(f"No data found for {company_ticker} between {start_date} and {end_date}.")
+        data = _clean_ohlcv(data, company_ticker, start_date, end_date)
+        if data is None:
             return None
 
-        # If columns are MultiIndex, flatten them to a single level
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)
-
-        # Standardize column names to uppercase
-        new_columns = []
-        for col in data.columns:
-            if isinstance(col, str):
-                new_columns.append(col.upper())
-            else:
-                new_columns.append(str(col).upper())
-        data.columns = new_columns
-
-        # Ensure required columns are present and properly named for TA-Lib
-        required_columns = ['OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOLUME']
-
-        if not all(col in data.columns for col in required_columns):
-            print(f"Missing required OHLCV data after standardization for {company_ticker}. "
-                  f"Available columns: {data.columns.tolist()}")
+        # Only the trailing lookback window matters for the newest bar
+        tail = data.iloc[-_MAX_PATTERN_LOOKBACK:]
+        opens = tail['OPEN'].to_numpy(np.float64)
+        highs = tail['HIGH'].to_numpy(np.float64)
+        lows = tail['LOW'].to_numpy(np.float64)
+        closes = tail['CLOSE'].to_numpy(np.float64)
+
+        latest_date = tail.index[-1].strftime('%Y-%m-%d')
+        latest_close = round(closes[-1], 2)
+
+        detected = []
+        for pattern_function, pattern_name in zip(_STREAM_PATTERN_FUNCTIONS, _STREAM_PATTERN_NAMES):
+            val = pattern_function(opens, highs, lows, closes)
+            if val != 0:
+                detected.append({
+                    "Date": latest_date,
+                    "Pattern": pattern_name,
+                    "Type": "Bullish" if val > 0 else "Bearish",
+                    "Closing Price": latest_close,
+                    "Recommendation": "Consider Buy" if val > 0 else "Consider Sell",
+                    "Value": val
+                })
+
+        if not detected:
+            print(f"No candlestick patterns on the latest bar for {company_ticker}.")
             return None
 
-        # Define candlestick patterns to detect
-        candlestick_patterns = {
-            "CDLDOJI": "Doji",
-            "CDLHAMMER": "Hammer",
-            "CDLINVERTEDHAMMER": "Inverted Hammer",
-            "CDLMORNINGSTAR": "Morning Star",
-            "CDLEVENINGSTAR": "Evening Star",
-            "CDLENGULFING": "Engulfing",
-            "CDLPIERCING": "Piercing Pattern",
-            "CDLDARKCLOUDCOVER": "Dark Cloud Cover",
-            "CDLHARAMI": "Harami",
-            "CDLHARAMICROSS": "Harami Cross",
-            "CDL3WHITESOLDIERS": "Three White Soldiers",
-            "CDL3BLACKCROWS": "Three Black Crows",
-            "CDLDRAGONFLYDOJI": "Dragonfly Doji",
-            "CDLGRAVESTONEDOJI": "Gravestone Doji",
-            "CDLMARUBOZU": "Marubozu",
-            "CDLSHOOTINGSTAR": "Shooting Star",
-            "CDLHANGINGMAN": "Hanging Man"
-        }
-
-        detected_patterns = []
-
-        # Ensure that the Series passed to TA-Lib functions are numeric
-        data['OPEN'] = pd.to_numeric(data['OPEN'], errors='coerce')
-        data['HIGH'] = pd.to_numeric(data['HIGH'], errors='coerce')
-        data['LOW'] = pd.to_numeric(data['LOW'], errors='coerce')
-        data['CLOSE'] = pd.to_numeric(data['CLOSE'], errors='coerce')
-        data['VOLUME'] = pd.to_numeric(data['VOLUME'], errors='coerce')
-
-        # Drop rows with any NaN values in the OHLCV columns, as TA-Lib functions require non-NaN inputs
-        data.dropna(subset=['OPEN', 'HIGH', 'LOW', 'CLOSE'], inplace=True)
-
-        if data.shape[0] < 2:
-            print(f"Not enough valid OHLC data after cleaning for {company_ticker}.")
+        return pd.DataFrame(detected)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+def get_candlestick_patterns(company_ticker, start_date, end_date, data=None):
+    try:
+        # Download historical data (served from the local parquet cache when
+        # the same request was made before), unless the caller already
+        # fetched it, e.g. via a batched fetch_all download
+        if data is None:
+            data = _download_with_cache(company_ticker, start_date, end_date)
+
+        data = _clean_ohlcv(data, company_ticker, start_date, end_date)
+        if data is None:
             return None
 
-        for pattern_func_name, pattern_name in candlestick_patterns.items():
-            pattern_function = getattr(talib, pattern_func_name, None)
-            if pattern_function:
-                pattern_result = pattern_function(
-                    data['OPEN'], data['HIGH'], data['LOW'], data['CLOSE']
-                )
-                matches = pattern_result[pattern_result != 0]
-
-                for idx in matches.index:
-                    date = idx.strftime('%Y-%m-%d')
-                    val = pattern_result[idx]
-                    pattern_type = "Bullish" if val > 0 else "Bearish"
-                    
-                    # Get the closing price for the detected pattern date
-                    closing_price = data.loc[idx, 'CLOSE']
-                    
-                    recommendation = ""
-                    if pattern_type == "Bullish":
-                        recommendation = "Consider Buy"
-                    elif pattern_type == "Bearish":
-                        recommendation = "Consider Sell"
-                    else:
-                        recommendation = "Neutral" # For patterns that don't clearly imply buy/sell
-
-                    detected_patterns.append({
-                        "Date": date,
-                        "Pattern": pattern_name,
-                        "Type": pattern_type,
-                        "Closing Price": round(closing_price, 2), # Round to 2 decimal places
-                        "Recommendation": recommendation,
-                        "Value": val # Keep value for debugging/reference if needed
-                    })
-            else:
-                print(f"Warning: TA-Lib function for {pattern_func_name} not found.")
-
-        if detected_patterns:
-            patterns_df = pd.DataFrame(detected_patterns)
-            patterns_df.sort_values(by="Date", inplace=True)
-            patterns_df.drop_duplicates(subset=['Date', 'Pattern'], keep='first', inplace=True)
-            return patterns_df
-        else:
+        # Extract the OHLC columns as float64 arrays once; TA-Lib's wrapper
+        # re-validates and copies a pandas Series on every call, so passing
+        # raw ndarrays avoids repaying that cost for each pattern function
+        opens = data['OPEN'].to_numpy(np.float64)
+        highs = data['HIGH'].to_numpy(np.float64)
+        lows = data['LOW'].to_numpy(np.float64)
+        closes = data['CLOSE'].to_numpy(np.float64)
+
+        # Stack all pattern results into one (pattern, bar) matrix and walk it
+        # once with np.nonzero, instead of masking and materializing a
+        # separate DataFrame per pattern followed by a concat
+        results = np.vstack([func(opens, highs, lows, closes) for func in _PATTERN_FUNCTIONS])
+        pattern_idx, bar_idx = np.nonzero(results)
+
+        if pattern_idx.size == 0:
             print(f"No candlestick patterns detected for {company_ticker}.")
             return None
 
+        matched_values = results[pattern_idx, bar_idx]
+        # Evaluate the bullish/bearish signal as one boolean mask and derive
+        # both label columns from it
+        bullish = matched_values > 0
+        patterns_df = pd.DataFrame({
+            "Date": data.index[bar_idx],
+            "Pattern": _PATTERN_NAME_ARRAY[pattern_idx],
+            "Type": np.where(bullish, "Bullish", "Bearish"),
+            "Closing Price": closes[bar_idx].round(2),
+            "Recommendation": np.where(bullish, "Consider Buy", "Consider Sell"),
+            "Value": matched_values # Keep value for debugging/reference if needed
+        })
+        # Sort and deduplicate on the raw datetime64 column, then format the
+        # dates with one vectorized strftime over just the surviving rows
+        patterns_df.sort_values(by="Date", inplace=True)
+        patterns_df.drop_duplicates(subset=['Date', 'Pattern'], keep='first', inplace=True)
+        patterns_df['Date'] = patterns_df['Date'].dt.strftime('%Y-%m-%d')
+        return patterns_df
+
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
 
+def save_patterns_to_csv(df, company_name, ticker_symbol, filename_prefix="candlestick_patterns"):
+    """
+    Saves the DataFrame of candlestick patterns to a CSV file.
+
+    The pattern tables are small, so plain CSV avoids spinning up an
+    Excel engine per save and writes in a fraction of the time.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing the detected candlestick patterns.
+        company_name (str): The name of the company.
+        ticker_symbol (str): The ticker symbol of the company.
+        filename_prefix (str): Prefix for the CSV filename.
+    """
+    if df is not None and not df.empty:
+        safe_company_name = "".join([c for c in company_name if c.isalnum() or c == ' ']).strip()
+        safe_ticker_symbol = "".join([c for c in ticker_symbol if c.isalnum()]).strip()
+
+        filename = f"{filename_prefix}_{safe_company_name}_{safe_ticker_symbol}.csv"
+
+        df_to_save = df.copy()
+        df_to_save.insert(0, "Company", company_name)
+
+        try:
+            # Drop the 'Value' column as it's more for internal logic/debugging than user output
+            if 'Value' in df_to_save.columns:
+                df_to_save = df_to_save.drop(columns=['Value'])
+            df_to_save.to_csv(filename, index=False)
+            print(f"Candlestick patterns saved to {filename}")
+        except Exception as e:
+            print(f"Error saving patterns to CSV for {company_name}: {e}")
+    else:
+        print(f"No patterns to save to CSV for {company_name}.")
+
 def save_patterns_to_excel(df, company_name, ticker_symbol, filename_prefix="candlestick_patterns"):
     """
     Saves the DataFrame of candlestick patterns to an Excel file.
@@ -143,7 +422,13 @@ def save_patterns_to_excel(df, company_name, ticker_symbol, filename_prefix="can
             # Drop the 'Value' column as it's more for internal logic/debugging than user output
             if 'Value' in df_to_save.columns:
                 df_to_save = df_to_save.drop(columns=['Value'])
-            df_to_save.to_excel(filename, index=False)
+            # Stream rows straight to disk instead of holding the whole
+            # worksheet in memory before writing
+            with pd.ExcelWriter(
+                filename, engine='xlsxwriter',
+                engine_kwargs={'options': {'constant_memory': True}}
+            ) as writer:
+                df_to_save.to_excel(writer, index=False)
             print(f"Candlestick patterns saved to {filename}")
         except Exception as e:
             print(f"Error saving patterns to Excel for {company_name}: {e}")
@@ -183,7 +468,7 @@ if __name__ == "__main__":
         if patterns is not None:
             print(f"Candlestick Patterns for {company_name_input} ({company_ticker_input}):")
             print(patterns.to_string(index=False))
-            save_patterns_to_excel(patterns, company_name_input, company_ticker_input)
+            save_patterns_to_csv(patterns, company_name_input, company_ticker_input)
         else:
             print(f"Could not detect patterns for {company_name_input} ({company_ticker_input}).")
         